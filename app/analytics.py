@@ -0,0 +1,250 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+def minute_of(ts: datetime) -> datetime:
+    """Truncate a timestamp to the start of its minute bucket."""
+    return ts.replace(second=0, microsecond=0)
+
+
+def _increment(db: Session, model, keys: Dict, counts: Dict):
+    """Add counts to the bucket row identified by keys, creating it if needed."""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        stmt = insert(model).values(**keys, **counts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={
+                name: getattr(model, name) + getattr(stmt.excluded, name)
+                for name in counts
+            },
+        )
+        db.execute(stmt)
+        return
+
+    result = db.execute(
+        update(model)
+        .filter_by(**keys)
+        .values({name: getattr(model, name) + n for name, n in counts.items()})
+    )
+    if result.rowcount == 0:
+        db.add(model(**keys, **counts))
+        db.flush()
+
+
+def record_question(db: Session, q: models.Question):
+    """Count a newly posted (and flushed) question in its minute bucket."""
+    bucket = minute_of(q.created_at)
+    _increment(
+        db,
+        models.RoomActivityBucket,
+        {"room_id": q.room_id, "bucket_start": bucket},
+        {"questions": 1},
+    )
+    if q.student_name:
+        _increment(
+            db,
+            models.RoomParticipantBucket,
+            {
+                "room_id": q.room_id,
+                "bucket_start": bucket,
+                "student_name": q.student_name,
+            },
+            {"questions": 1},
+        )
+
+
+def record_vote(db: Session, q: models.Question, v: models.QuestionVote):
+    """Count a newly cast (and flushed) vote in its minute bucket."""
+    bucket = minute_of(v.created_at)
+    _increment(
+        db,
+        models.RoomActivityBucket,
+        {"room_id": q.room_id, "bucket_start": bucket},
+        {"votes": 1},
+    )
+    if q.student_name and v.vote_type == "up":
+        _increment(
+            db,
+            models.RoomParticipantBucket,
+            {
+                "room_id": q.room_id,
+                "bucket_start": bucket,
+                "student_name": q.student_name,
+            },
+            {"upvotes": 1},
+        )
+
+
+def record_solved(db: Session, q: models.Question):
+    """Count a question solved at q.solved_at in that minute's bucket."""
+    _increment(
+        db,
+        models.RoomActivityBucket,
+        {"room_id": q.room_id, "bucket_start": minute_of(q.solved_at)},
+        {
+            "solved": 1,
+            "solve_seconds": int((q.solved_at - q.created_at).total_seconds()),
+        },
+    )
+
+
+def bucket_counts(db: Session, room_id: int) -> Dict[Tuple, Dict[str, int]]:
+    """Return a room's rollups as {(model, key values): counts}."""
+    counts = {}
+    for model, keys, names in (
+        (
+            models.RoomActivityBucket,
+            ("room_id", "bucket_start"),
+            ("questions", "votes", "solved", "solve_seconds"),
+        ),
+        (
+            models.RoomParticipantBucket,
+            ("room_id", "bucket_start", "student_name"),
+            ("questions", "upvotes"),
+        ),
+    ):
+        for row in db.query(model).filter(model.room_id == room_id):
+            key = (model, tuple((k, getattr(row, k)) for k in keys))
+            counts[key] = {name: getattr(row, name) for name in names}
+    return counts
+
+
+def add_bucket_counts(
+    db: Session,
+    counts: Dict[Tuple, Dict[str, int]],
+    minus: Optional[Dict[Tuple, Dict[str, int]]] = None,
+):
+    """Add rollups read with bucket_counts, less those in minus, to db.
+
+    Buckets are incremented in place, so this is safe while the room is live.
+    """
+    minus = minus or {}
+    for (model, keys), row_counts in counts.items():
+        before = minus.get((model, keys), {})
+        delta = {
+            name: n - before.get(name, 0)
+            for name, n in row_counts.items()
+            if n != before.get(name, 0)
+        }
+        if delta:
+            _increment(db, model, dict(keys), delta)
+
+
+def backfill(db: Session, room_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild the rollups of the given rooms (or all rooms) from raw rows.
+
+    Questions solved before solved_at was recorded count towards nothing,
+    since there is no way to know when they were solved. Writes landing in a
+    room while it is rebuilt may be lost, so run it on quiet rooms.
+    Returns the number of rooms rebuilt.
+    """
+    rooms_query = db.query(models.Room.id)
+    if room_ids is not None:
+        rooms_query = rooms_query.filter(models.Room.id.in_(list(room_ids)))
+    ids = [room_id for (room_id,) in rooms_query.all()]
+
+    for room_id in ids:
+        activity: Dict[datetime, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        participants: Dict[Tuple[datetime, str], Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+        questions = (
+            db.query(
+                models.Question.created_at,
+                models.Question.student_name,
+                models.Question.solved_at,
+            )
+            .filter(models.Question.room_id == room_id)
+            .yield_per(1000)
+        )
+        for created_at, student_name, solved_at in questions:
+            activity[minute_of(created_at)]["questions"] += 1
+            if student_name:
+                participants[(minute_of(created_at), student_name)]["questions"] += 1
+            if solved_at is not None:
+                solved = activity[minute_of(solved_at)]
+                solved["solved"] += 1
+                solved["solve_seconds"] += int((solved_at - created_at).total_seconds())
+
+        votes = (
+            db.query(
+                models.QuestionVote.created_at,
+                models.QuestionVote.vote_type,
+                models.Question.student_name,
+            )
+            .join(
+                models.Question, models.Question.id == models.QuestionVote.question_id
+            )
+            .filter(models.Question.room_id == room_id)
+            .yield_per(1000)
+        )
+        for created_at, vote_type, student_name in votes:
+            activity[minute_of(created_at)]["votes"] += 1
+            if student_name and vote_type == "up":
+                participants[(minute_of(created_at), student_name)]["upvotes"] += 1
+
+        db.query(models.RoomActivityBucket).filter(
+            models.RoomActivityBucket.room_id == room_id
+        ).delete(synchronize_session=False)
+        db.query(models.RoomParticipantBucket).filter(
+            models.RoomParticipantBucket.room_id == room_id
+        ).delete(synchronize_session=False)
+
+        db.add_all(
+            models.RoomActivityBucket(room_id=room_id, bucket_start=bucket, **counts)
+            for bucket, counts in activity.items()
+        )
+        db.add_all(
+            models.RoomParticipantBucket(
+                room_id=room_id, bucket_start=bucket, student_name=name, **counts
+            )
+            for (bucket, name), counts in participants.items()
+        )
+        db.commit()
+
+    return len(ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room analytics rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser(
+        "backfill", help="Rebuild rollups from raw questions and votes"
+    )
+    backfill_parser.add_argument(
+        "room_ids", nargs="*", type=int, help="Rooms to rebuild (default: all)"
+    )
+    args = parser.parse_args()
+
+    from app import sharding
+    from app.database import SessionLocal
+
+    room_ids = args.room_ids or None
+    if sharding.enabled():
+        # Each shard rebuilds the rooms it holds
+        count = sum(sharding.fan_out(lambda db: backfill(db, room_ids)))
+    else:
+        db = SessionLocal()
+        try:
+            count = backfill(db, room_ids)
+        finally:
+            db.close()
+    print(f"Rebuilt analytics for {count} room(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import os
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
@@ -27,3 +32,72 @@ SessionLocal = sessionmaker(
 
 # Base model
 Base = declarative_base()
+
+# Optional read replicas, as a comma-separated list of database URLs
+READ_REPLICA_URLS = [
+    url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()
+]
+# Replicas further behind the primary than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+# How long a replica health check result is reused
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+
+# Checked on replicas without a lag query: a missing or empty database
+# file would otherwise pass a plain SELECT 1
+REPLICA_PROBE_SQL = text("SELECT 1 FROM teachers LIMIT 1")
+
+# Seconds of replay lag; zero when the replica has replayed all it received
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """Round-robins reads over replicas that are up and not lagging."""
+
+    def __init__(self, engines: List[Engine]):
+        self.engines = engines
+        self._cycle = itertools.cycle(range(len(engines)))
+        self._lock = threading.Lock()
+        # engine index -> (checked_at, healthy)
+        self._status: Dict[int, Tuple[float, bool]] = {}
+
+    def _check(self, engine: Engine) -> bool:
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name != "postgresql":
+                    conn.execute(REPLICA_PROBE_SQL)
+                    return True
+                lag = conn.execute(POSTGRES_LAG_SQL).scalar()
+                return lag is not None and float(lag) <= REPLICA_MAX_LAG_SECONDS
+        except Exception:
+            return False
+
+    def _healthy(self, index: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            checked_at, healthy = self._status.get(index, (None, False))
+            if checked_at is not None and now - checked_at < REPLICA_CHECK_INTERVAL:
+                return healthy
+            # Claim the check so concurrent requests reuse the old result
+            self._status[index] = (now, healthy)
+        healthy = self._check(self.engines[index])
+        with self._lock:
+            self._status[index] = (time.monotonic(), healthy)
+        return healthy
+
+    def pick(self) -> Optional[Engine]:
+        """Return a healthy replica engine, or None to fall back to the primary."""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._cycle)
+            if self._healthy(index):
+                return self.engines[index]
+        return None
+
+
+replicas = ReplicaSet(
+    [create_engine(url, pool_pre_ping=True) for url in READ_REPLICA_URLS]
+)
@@ -1,13 +1,26 @@
-from fastapi import Header, HTTPException, Depends, status
+from fastapi import Header, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app import models, security
+from app.database import SessionLocal, replicas
+from app import models, security, sharding, statements
 from jose import JWTError, jwt
 from typing import Optional, Generator
+import os
+import time
 
 security_scheme = HTTPBearer()
 
+# Clients that wrote this recently read from the primary to see their writes
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))
+LAST_WRITE_HEADER = "X-Last-Write"
+LAST_WRITE_COOKIE = "questup_last_write"
+# The frontend is served from another origin, so the cookie needs
+# SameSite=None, which browsers only accept on Secure (HTTPS) cookies.
+# Set to false for local development over plain HTTP.
+SECURE_COOKIES = os.getenv("SECURE_COOKIES", "true").lower() != "false"
+
 
 def get_db() -> Generator:
     """Dependency to get a database session."""
@@ -18,11 +31,108 @@ def get_db() -> Generator:
         db.close()
 
 
+def get_write_db(response: Response) -> Generator:
+    """Dependency to get a primary session for handlers that write.
+
+    Each commit marks the client as a recent writer, so its next reads also
+    go to the primary and see the write. The time of the write is returned
+    in the X-Last-Write header, which clients send back on their reads.
+    It is also set as a cookie, as a fallback for clients that send
+    credentials and whose browsers accept cross-site cookies.
+    """
+    db = SessionLocal()
+
+    @event.listens_for(db, "after_commit")
+    def mark_write(session):
+        last_write = str(time.time())
+        response.headers[LAST_WRITE_HEADER] = last_write
+        response.set_cookie(
+            LAST_WRITE_COOKIE,
+            last_write,
+            max_age=READ_YOUR_WRITES_SECONDS,
+            httponly=True,
+            secure=SECURE_COOKIES,
+            samesite="none" if SECURE_COOKIES else "lax",
+        )
+
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _wrote_recently(request: Request) -> bool:
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(
+        LAST_WRITE_COOKIE
+    )
+    try:
+        last_write = float(value or 0)
+    except ValueError:
+        return False
+    return time.time() - last_write < READ_YOUR_WRITES_SECONDS
+
+
+def get_read_db(request: Request) -> Generator:
+    """Dependency to get a session for read-only handlers.
+
+    Uses a healthy read replica when one is configured, and the primary when
+    none is available or the client wrote something a moment ago.
+    """
+    engine = None if _wrote_recently(request) else replicas.pick()
+    db = SessionLocal(bind=engine) if engine is not None else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _shard_session(shard: Optional[int], detail: str) -> Generator:
+    if shard is None:
+        raise HTTPException(status_code=404, detail=detail)
+    db = sharding.session_for_shard(shard)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_room_db(room_id: int, response: Response) -> Generator:
+    """Dependency to get a session for writes to a room's data.
+
+    This is the room's shard when rooms are sharded, the primary otherwise.
+    """
+    if sharding.enabled():
+        yield from _shard_session(sharding.shard_for_room(room_id), "Room not found")
+    else:
+        yield from get_write_db(response)
+
+
+def get_room_read_db(room_id: int, request: Request) -> Generator:
+    """Dependency to get a session for reads of a room's data."""
+    if sharding.enabled():
+        yield from _shard_session(sharding.shard_for_room(room_id), "Room not found")
+    else:
+        yield from get_read_db(request)
+
+
+def get_question_db(question_id: int, response: Response) -> Generator:
+    """Dependency to get a session for writes to a question's room."""
+    if sharding.enabled():
+        yield from _shard_session(
+            sharding.shard_for_question(question_id), "Question not found"
+        )
+    else:
+        yield from get_write_db(response)
+
+
 def get_current_teacher(
     auth: HTTPAuthorizationCredentials = Depends(security_scheme),
-    db: Session = Depends(get_db),
-) -> models.Teacher:
-    """Dependency to get the currently authenticated teacher from the JWT token."""
+    db: Session = Depends(get_read_db),
+) -> Row:
+    """Dependency to get the currently authenticated teacher from the JWT token.
+
+    Returns a plain row with the teacher's id, name and email.
+    """
     token = auth.credentials
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -39,7 +149,7 @@ def get_current_teacher(
     except JWTError:
         raise credentials_exception
 
-    teacher = db.query(models.Teacher).filter(models.Teacher.email == email).first()
+    teacher = db.execute(statements.TEACHER_BY_EMAIL, {"email": email}).first()
     if teacher is None:
         raise credentials_exception
     return teacher
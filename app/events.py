@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# "memory" for a single process, "postgres" to fan out over LISTEN/NOTIFY
+EVENT_BACKEND = os.getenv("EVENT_BACKEND", "memory")
+EVENT_CHANNEL = os.getenv("EVENT_CHANNEL", "questup_room_events")
+
+# Identifies this worker so it can skip its own notifications
+WORKER_ID = uuid.uuid4().hex
+
+Handler = Callable[[Dict], None]
+
+
+class LatencyStats:
+    """Running write-to-delivery latency for events from other workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def record(self, ms: float):
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            self.last_ms = ms
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            avg = self.total_ms / self.count if self.count else 0.0
+            return {
+                "count": self.count,
+                "avg_ms": round(avg, 3),
+                "max_ms": round(self.max_ms, 3),
+                "last_ms": round(self.last_ms, 3),
+            }
+
+
+class InMemoryBus:
+    """Delivers room events to handlers in the current process only."""
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        self.latency = LatencyStats()
+
+    def subscribe(self, handler: Handler):
+        self._handlers.append(handler)
+
+    def publish(self, event: Dict):
+        event = dict(event, origin=WORKER_ID, sent_at=time.time())
+        self._deliver(event)
+
+    def _deliver(self, event: Dict):
+        if event.get("origin") != WORKER_ID:
+            self.latency.record((time.time() - event["sent_at"]) * 1000)
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Event handler failed for %s", event.get("type"))
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PostgresBus(InMemoryBus):
+    """Fans room events out to every worker with Postgres LISTEN/NOTIFY.
+
+    Events are delivered locally right away and sent to the other workers with
+    NOTIFY; a listener thread per worker feeds their notifications back in.
+    """
+
+    def __init__(self, engine: Engine, channel: str = EVENT_CHANNEL):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def publish(self, event: Dict):
+        event = dict(event, origin=WORKER_ID, sent_at=time.time())
+        self._deliver(event)
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": json.dumps(event)},
+                )
+                conn.commit()
+        except Exception:
+            logger.exception("Could not publish %s", event.get("type"))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._listen_forever, name="event-listener", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _listen_forever(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Event listener disconnected, retrying")
+                self._stopped.wait(1)
+
+    def _listen(self):
+        # A dedicated DBAPI connection, outside the pool, held for LISTEN
+        conn = self.engine.raw_connection()
+        try:
+            conn.detach()
+            dbapi_conn = conn.dbapi_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+
+            while not self._stopped.is_set():
+                if select.select([dbapi_conn], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    notify = dbapi_conn.notifies.pop(0)
+                    event = json.loads(notify.payload)
+                    if event.get("origin") != WORKER_ID:
+                        self._deliver(event)
+        finally:
+            conn.close()
+
+
+def create_bus() -> InMemoryBus:
+    """Build the event bus selected by EVENT_BACKEND."""
+    if EVENT_BACKEND == "postgres":
+        from app.database import engine
+
+        return PostgresBus(engine)
+    return InMemoryBus()
+
+
+bus = create_bus()
+
+
+def publish_room_event(event_type: str, room_id: int, **fields):
+    """Tell every worker that a room's data has changed."""
+    bus.publish({"type": event_type, "room_id": room_id, **fields})
@@ -2,14 +2,31 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import traceback
+from contextlib import asynccontextmanager
 
+from app import events, participants, ranking, sharding, statements
 from app.database import Base, engine
+from app.deps import LAST_WRITE_HEADER
 from app.routers.auth import router as auth
 from app.routers.rooms import router as room
 from app.routers.questions import router as question
 from app.routers.votes import router as vote
+from app.routers.batch import router as batch
+from app.routers.analytics import router as analytics
 
-app = FastAPI(title="Questup Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    events.bus.subscribe(ranking.handle_room_event)
+    events.bus.subscribe(sharding.handle_room_event)
+    events.bus.start()
+    participants.persister.start()
+    yield
+    participants.persister.stop()
+    events.bus.stop()
+
+
+app = FastAPI(title="Questup Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,13 +38,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[LAST_WRITE_HEADER],
 )
 
 
+@app.middleware("http")
+async def track_statement_cache(request: Request, call_next):
+    """Report each request's compiled statement cache hit rate in a header."""
+    stats = statements.StatementStats()
+    token = statements.current_request.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        statements.current_request.reset(token)
+    if stats.hit_rate is not None:
+        response.headers["X-Statement-Cache-Hit-Rate"] = str(stats.hit_rate)
+    return response
+
+
 app.include_router(auth)
 app.include_router(room)
 app.include_router(question)
 app.include_router(vote)
+app.include_router(batch)
+app.include_router(analytics)
 
 
 @app.get("/")
@@ -38,3 +72,11 @@ def home():
 @app.get("/health")
 def health():
     return {"status": "Running Successfully!!!"}
+
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "event_latency": events.bus.latency.snapshot(),
+        "statement_cache": statements.totals.snapshot(),
+    }
@@ -1,4 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Boolean,
+    ForeignKey,
+    Text,
+    Index,
+    UniqueConstraint,
+    LargeBinary,
+)
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -31,6 +42,10 @@ class Room(Base):
     owner_id = Column(Integer, ForeignKey("teachers.id"), nullable=False)
     is_open = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped on every change to the room's questions, used as a sync cursor
+    change_seq = Column(Integer, default=0, server_default="0", nullable=False)
+    # HyperLogLog sketch of participants, see app/participants.py
+    participant_sketch = Column(LargeBinary, nullable=True)
 
     owner = relationship("Teacher")
 
@@ -44,9 +59,15 @@ class Question(Base):
     student_name = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_solved = Column(Boolean, default=False)
+    solved_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # Room change_seq of the last change to this question
+    updated_seq = Column(Integer, default=0, server_default="0", nullable=False)
 
     room = relationship("Room")
 
+    __table_args__ = (Index("ix_questions_room_updated_seq", "room_id", "updated_seq"),)
+
 
 class QuestionVote(Base):
     __tablename__ = "question_votes"
@@ -55,3 +76,44 @@ class QuestionVote(Base):
     voter_token = Column(String, nullable=True)
     vote_type = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RoomActivityBucket(Base):
+    __tablename__ = "room_activity_buckets"
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    questions = Column(Integer, default=0, nullable=False)
+    votes = Column(Integer, default=0, nullable=False)
+    solved = Column(Integer, default=0, nullable=False)
+    # Sum of (solved_at - created_at) over questions solved in this minute
+    solve_seconds = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (UniqueConstraint("room_id", "bucket_start"),)
+
+
+class RoomParticipantBucket(Base):
+    __tablename__ = "room_participant_buckets"
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    student_name = Column(String, nullable=False)
+    questions = Column(Integer, default=0, nullable=False)
+    upvotes = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (UniqueConstraint("room_id", "bucket_start", "student_name"),)
+
+
+class RoomShard(Base):
+    __tablename__ = "room_shards"
+    # Allocates globally unique room ids when rooms are sharded
+    room_id = Column(Integer, primary_key=True)
+    room_code = Column(String, unique=True, index=True, nullable=False)
+    shard = Column(Integer, nullable=False)
+
+
+class QuestionShard(Base):
+    __tablename__ = "question_shards"
+    # Allocates globally unique question ids when rooms are sharded
+    question_id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey("room_shards.room_id"), nullable=False)
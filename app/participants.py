@@ -0,0 +1,263 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models, sharding
+from app.database import SessionLocal
+from app.hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# How often in-memory sketches are merged with the stored ones
+PERSIST_INTERVAL_SECONDS = float(os.getenv("PARTICIPANT_PERSIST_SECONDS", 30))
+# Sketches of rooms unused for this long are dropped once stored
+IDLE_SECONDS = float(os.getenv("PARTICIPANT_IDLE_SECONDS", 600))
+
+# Per-room participant sketches. A room's sketch only includes the stored
+# sketch once it is in _loaded; until then it holds only local additions.
+_sketches: Dict[int, HyperLogLog] = {}
+_loaded: Set[int] = set()
+_dirty: Set[int] = set()
+# Rooms with no stored sketch, seeded from their history by the next persist()
+_unseeded: Set[int] = set()
+# room_id -> monotonic time the sketch was last recorded to or read
+_last_used: Dict[int, float] = {}
+_lock = threading.Lock()
+
+
+def record(room_id: int, participant: Optional[str]):
+    """Count a student (by voter_token or student_name) as a room participant."""
+    if not participant:
+        return
+    with _lock:
+        sketch = _sketches.setdefault(room_id, HyperLogLog())
+        _last_used[room_id] = time.monotonic()
+        if sketch.add(participant):
+            _dirty.add(room_id)
+
+
+def _seed(db: Session, room_id: int) -> HyperLogLog:
+    """Build a room's first sketch from the names and tokens already stored."""
+    sketch = HyperLogLog()
+    names = db.query(models.Question.student_name).filter(
+        models.Question.room_id == room_id, models.Question.student_name.isnot(None)
+    )
+    tokens = (
+        db.query(models.QuestionVote.voter_token)
+        .join(models.Question, models.Question.id == models.QuestionVote.question_id)
+        .filter(
+            models.Question.room_id == room_id,
+            models.QuestionVote.voter_token.isnot(None),
+        )
+    )
+    sketch.update(name for (name,) in names.yield_per(1000))
+    sketch.update(token for (token,) in tokens.yield_per(1000))
+    return sketch
+
+
+def _load(db: Session, room_id: int) -> Tuple[HyperLogLog, bool]:
+    """Return the stored sketch of a room, and whether it had to be seeded."""
+    data = (
+        db.query(models.Room.participant_sketch)
+        .filter(models.Room.id == room_id)
+        .scalar()
+    )
+    if data is None:
+        return _seed(db, room_id), True
+    return HyperLogLog.from_bytes(data), False
+
+
+def sketch_for(db: Session, room_id: int) -> HyperLogLog:
+    """Return a room's sketch, folding in the stored one on first use."""
+    with _lock:
+        if room_id in _loaded:
+            _last_used[room_id] = time.monotonic()
+            return _sketches[room_id]
+
+    stored, seeded = _load(db, room_id)
+    with _lock:
+        sketch = _sketches.setdefault(room_id, HyperLogLog())
+        _last_used[room_id] = time.monotonic()
+        if room_id not in _loaded:
+            sketch.merge(stored)
+            if seeded:
+                _dirty.add(room_id)
+            _loaded.add(room_id)
+        return sketch
+
+
+def count(db: Session, room_id: int) -> int:
+    """Estimated distinct participants of a room (about 3% standard error)."""
+    return sketch_for(db, room_id).count()
+
+
+def count_stored(room_id: int, data: Optional[bytes]) -> int:
+    """Estimated participants of a room, given its stored sketch.
+
+    For callers that read participant_sketch along with other room columns,
+    so counting needs no query of its own. A room with no stored sketch is
+    not seeded here, since that scans its history. It counts local additions
+    until the next persist() seeds it.
+    """
+    with _lock:
+        sketch = _sketches.setdefault(room_id, HyperLogLog())
+        _last_used[room_id] = time.monotonic()
+        if room_id not in _loaded:
+            if data is None:
+                _unseeded.add(room_id)
+            else:
+                sketch.merge(HyperLogLog.from_bytes(data))
+                _loaded.add(room_id)
+        return sketch.count()
+
+
+def count_many(room_ids: Iterable[int]) -> int:
+    """Estimated distinct participants across rooms whose sketches are loaded."""
+    total = HyperLogLog()
+    with _lock:
+        for room_id in room_ids:
+            sketch = _sketches.get(room_id)
+            if sketch is not None:
+                total.merge(sketch)
+    return total.count()
+
+
+def _write(room_id: int):
+    """Merge a changed sketch with its stored copy and write the result."""
+    db = sharding.session_for_room(room_id)
+    if db is None:
+        return
+    try:
+        # Rooms only known from local additions need their history first
+        sketch_for(db, room_id)
+        room = (
+            db.query(models.Room)
+            .filter(models.Room.id == room_id)
+            .with_for_update()
+            .first()
+        )
+        if room is None:
+            return
+        stored = HyperLogLog.from_bytes(room.participant_sketch)
+        with _lock:
+            sketch = _sketches.get(room_id)
+            if sketch is None:
+                return
+            sketch.merge(stored)
+            _dirty.discard(room_id)
+            room.participant_sketch = sketch.to_bytes()
+        db.commit()
+    except Exception:
+        logger.exception("Could not persist participants of room %s", room_id)
+        with _lock:
+            _dirty.add(room_id)
+    finally:
+        db.close()
+
+
+def _refresh(room_ids: List[int]):
+    """Fold in what other workers stored for unchanged rooms, without locking.
+
+    Rooms are read in one query per database.
+    """
+    by_shard: Dict[Optional[int], List[int]] = defaultdict(list)
+    for room_id in room_ids:
+        if not sharding.enabled():
+            by_shard[None].append(room_id)
+            continue
+        shard = sharding.shard_for_room(room_id)
+        if shard is not None:
+            by_shard[shard].append(room_id)
+
+    for shard, ids in by_shard.items():
+        db = SessionLocal() if shard is None else sharding.session_for_shard(shard)
+        try:
+            rows = (
+                db.query(models.Room.id, models.Room.participant_sketch)
+                .filter(models.Room.id.in_(ids))
+                .all()
+            )
+        except Exception:
+            logger.exception("Could not refresh participants of rooms %s", ids)
+            continue
+        finally:
+            db.close()
+        with _lock:
+            for room_id, data in rows:
+                sketch = _sketches.get(room_id)
+                if sketch is not None:
+                    sketch.merge(HyperLogLog.from_bytes(data))
+
+
+def persist():
+    """Merge in-memory sketches with the stored ones.
+
+    Changed sketches are written back under a row lock, and unchanged ones
+    pick up what other workers stored, so all workers converge within one
+    interval. Rooms idle for IDLE_SECONDS are forgotten once stored, and
+    loaded again from the database when next used. Rooms first seen without
+    a stored sketch are seeded from their history first.
+    """
+    with _lock:
+        unseeded = list(_unseeded)
+        _unseeded.clear()
+    for room_id in unseeded:
+        db = sharding.session_for_room(room_id)
+        if db is None:
+            continue
+        try:
+            sketch_for(db, room_id)
+        except Exception:
+            logger.exception("Could not seed participants of room %s", room_id)
+        finally:
+            db.close()
+
+    now = time.monotonic()
+    with _lock:
+        for room_id, used in list(_last_used.items()):
+            if now - used > IDLE_SECONDS and room_id not in _dirty:
+                _sketches.pop(room_id, None)
+                _loaded.discard(room_id)
+                del _last_used[room_id]
+        dirty = list(_dirty)
+        clean = [room_id for room_id in _loaded if room_id not in _dirty]
+
+    for room_id in dirty:
+        _write(room_id)
+    if clean:
+        _refresh(clean)
+
+
+class Persister:
+    """Background thread that calls persist() every PERSIST_INTERVAL_SECONDS."""
+
+    def __init__(self, interval: float = PERSIST_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="participant-persister", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            persist()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        persist()
+
+
+persister = Persister()
@@ -0,0 +1,320 @@
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from heapq import merge
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models, sharding
+from app.events import WORKER_ID
+
+# A question needs 10x the votes to stay level with one posted this much later.
+HOT_DECAY_SECONDS = 45000
+HOT_EPOCH = datetime(2024, 1, 1)
+# Up votes this recent when a ranking is built are remembered, so that their
+# own record_vote call, which may come after the build, is not counted twice
+LOAD_OVERLAP_SECONDS = 60
+# Rankings not read for this long are dropped, and rebuilt on the next read
+IDLE_SECONDS = float(os.getenv("RANKING_IDLE_SECONDS", 600))
+# Rankings are rebuilt after this long, so changes no event told this worker
+# about (such as rows copied by a room move run from the CLI) show up
+MAX_AGE_SECONDS = float(os.getenv("RANKING_MAX_AGE_SECONDS", 60))
+
+
+def hot_score(votes: int, created_at: datetime) -> float:
+    """Time-decayed score: log-scaled votes plus a recency term.
+
+    The recency term grows with the creation time, so a question's score only
+    changes when it is voted on and never needs re-scoring as time passes.
+    """
+    age = (created_at - HOT_EPOCH).total_seconds()
+    return round(math.log10(votes + 1) + age / HOT_DECAY_SECONDS, 7)
+
+
+class RoomRanking:
+    """Questions of a single room kept sorted by hot score.
+
+    Unsolved and solved questions are kept in separate sorted lists so that
+    either can be read on its own, and both can be merged lazily for top-k.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # question_id -> (votes, created_at, is_solved)
+        self._entries: Dict[int, Tuple[int, datetime, bool]] = {}
+        self._unsolved: List[Tuple[float, int]] = []
+        self._solved: List[Tuple[float, int]] = []
+        # Ids of recent up votes already included in the loaded counts
+        self._counted_votes: Set[int] = set()
+
+    def _key(self, question_id: int) -> Tuple[float, int]:
+        votes, created_at, _ = self._entries[question_id]
+        return (-hot_score(votes, created_at), -question_id)
+
+    def _bucket(self, question_id: int) -> List[Tuple[float, int]]:
+        return self._solved if self._entries[question_id][2] else self._unsolved
+
+    def _detach(self, question_id: int):
+        bucket = self._bucket(question_id)
+        key = self._key(question_id)
+        i = bisect_left(bucket, key)
+        if i < len(bucket) and bucket[i] == key:
+            del bucket[i]
+
+    def _attach(self, question_id: int):
+        # Finding the slot is O(log n); the list shift is O(n) but a memmove,
+        # which is cheap for the few hundred questions a room holds
+        insort(self._bucket(question_id), self._key(question_id))
+
+    def add(self, question_id: int, created_at: datetime, votes: int = 0,
+            is_solved: bool = False):
+        """Rank a question; one that is already ranked keeps its entry."""
+        with self._lock:
+            if question_id in self._entries:
+                return
+            self._entries[question_id] = (votes, created_at, is_solved)
+            self._attach(question_id)
+
+    def vote(self, question_id: int, vote_id: Optional[int] = None):
+        """Count an up vote, unless the ranking was loaded with it."""
+        with self._lock:
+            if question_id not in self._entries or vote_id in self._counted_votes:
+                return
+            self._detach(question_id)
+            votes, created_at, is_solved = self._entries[question_id]
+            self._entries[question_id] = (votes + 1, created_at, is_solved)
+            self._attach(question_id)
+
+    def mark_solved(self, question_id: int):
+        with self._lock:
+            if question_id not in self._entries:
+                return
+            self._detach(question_id)
+            votes, created_at, _ = self._entries[question_id]
+            self._entries[question_id] = (votes, created_at, True)
+            self._attach(question_id)
+
+    def top(self, k: Optional[int] = None,
+            solved: Optional[bool] = None) -> List[Tuple[int, int]]:
+        """Return up to k (question_id, votes) pairs, hottest first."""
+        with self._lock:
+            if solved is None:
+                keys = merge(self._unsolved, self._solved)
+            elif solved:
+                keys = iter(self._solved)
+            else:
+                keys = iter(self._unsolved)
+            return [
+                (-qid, self._entries[-qid][0]) for _, qid in islice(keys, k)
+            ]
+
+
+# room_id -> loaded ranking
+_rooms: Dict[int, RoomRanking] = {}
+# room_id -> lock held while that room's ranking is built, so that only the
+# first read of a room loads it and other rooms are not held up
+_loading: Dict[int, threading.Lock] = {}
+# Rooms changed while their ranking was being built
+_changed: Set[int] = set()
+# room_id -> monotonic time the ranking was last read
+_last_used: Dict[int, float] = {}
+# room_id -> monotonic time the ranking was built
+_built_at: Dict[int, float] = {}
+_last_sweep = time.monotonic()
+_rooms_lock = threading.Lock()
+
+
+def _load_room(db: Session, room_id: int) -> RoomRanking:
+    ranking = RoomRanking()
+    # Votes are counted here rather than in SQL so that the recent ids come
+    # from the same snapshot as the counts
+    recent = datetime.utcnow() - timedelta(seconds=LOAD_OVERLAP_SECONDS)
+    up_votes = (
+        db.query(
+            models.QuestionVote.question_id,
+            models.QuestionVote.id,
+            models.QuestionVote.created_at,
+        )
+        .join(models.Question)
+        .filter(
+            models.Question.room_id == room_id,
+            models.QuestionVote.vote_type == "up",
+        )
+        .yield_per(1000)
+    )
+    votes_by_question: Dict[int, int] = Counter()
+    for qid, vote_id, created_at in up_votes:
+        votes_by_question[qid] += 1
+        if created_at is None or created_at >= recent:
+            ranking._counted_votes.add(vote_id)
+    rows = (
+        db.query(
+            models.Question.id,
+            models.Question.created_at,
+            models.Question.is_solved,
+        )
+        .filter(models.Question.room_id == room_id)
+        .all()
+    )
+    for qid, created_at, is_solved in rows:
+        ranking.add(qid, created_at, votes_by_question.get(qid, 0), bool(is_solved))
+    return ranking
+
+
+def _forget(room_id: int):
+    """Drop a stored ranking; must be called with _rooms_lock held."""
+    _rooms.pop(room_id, None)
+    _last_used.pop(room_id, None)
+    _built_at.pop(room_id, None)
+
+
+def _evict_idle():
+    """Drop rankings idle for IDLE_SECONDS; checked at most once a minute.
+
+    Must be called with _rooms_lock held.
+    """
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < 60:
+        return
+    _last_sweep = now
+    for room_id, used in list(_last_used.items()):
+        if now - used > IDLE_SECONDS:
+            _forget(room_id)
+
+
+def get_room_ranking(room_id: int) -> RoomRanking:
+    """Return the ranking for a room, building it from the database on first use.
+
+    It is always built from the primary (or the room's shard): a ranking
+    built from a lagging replica would be kept with the rows it missed. A
+    ranking whose room changed while it was being built may be missing
+    that change, so it is returned for this read but not kept.
+    """
+    with _rooms_lock:
+        _evict_idle()
+        now = time.monotonic()
+        ranking = _rooms.get(room_id)
+        if ranking is not None and now - _built_at[room_id] < MAX_AGE_SECONDS:
+            _last_used[room_id] = now
+            return ranking
+        if ranking is not None:
+            _forget(room_id)
+        room_lock = _loading.setdefault(room_id, threading.Lock())
+
+    with room_lock:
+        with _rooms_lock:
+            ranking = _rooms.get(room_id)
+            if ranking is not None:
+                return ranking
+            _changed.discard(room_id)
+
+        db = sharding.session_for_room(room_id)
+        if db is None:
+            # Unknown room: nothing to rank and nothing worth keeping
+            with _rooms_lock:
+                _loading.pop(room_id, None)
+            return RoomRanking()
+        try:
+            ranking = _load_room(db, room_id)
+        finally:
+            db.close()
+
+        with _rooms_lock:
+            if room_id not in _changed:
+                _rooms[room_id] = ranking
+                _last_used[room_id] = _built_at[room_id] = time.monotonic()
+                _loading.pop(room_id, None)
+            _changed.discard(room_id)
+        return ranking
+
+
+def _loaded_ranking(room_id: int) -> Optional[RoomRanking]:
+    """Return a room's ranking if loaded, noting the change if it is loading."""
+    with _rooms_lock:
+        ranking = _rooms.get(room_id)
+        if ranking is None and room_id in _loading:
+            _changed.add(room_id)
+        return ranking
+
+
+def record_question(question: models.Question):
+    """Add a newly posted question to its room's ranking, if one is loaded."""
+    ranking = _loaded_ranking(question.room_id)
+    if ranking is not None:
+        ranking.add(question.id, question.created_at, 0, bool(question.is_solved))
+
+
+def record_vote(question: models.Question, vote: models.QuestionVote):
+    """Apply an up vote to its room's ranking, if one is loaded."""
+    if vote.vote_type != "up":
+        return
+    ranking = _loaded_ranking(question.room_id)
+    if ranking is not None:
+        ranking.vote(question.id, vote.id)
+
+
+def record_solved(question: models.Question):
+    """Move a question into the solved list of its room's ranking."""
+    ranking = _loaded_ranking(question.room_id)
+    if ranking is not None:
+        ranking.mark_solved(question.id)
+
+
+def drop_room(room_id: int):
+    """Forget a room's ranking so it is rebuilt on the next read."""
+    with _rooms_lock:
+        _forget(room_id)
+        if room_id in _loading:
+            _changed.add(room_id)
+
+
+def _apply_remote(event: dict) -> bool:
+    """Apply another worker's change to a loaded ranking.
+
+    Returns False if the event lacks the fields needed to apply it.
+    """
+    question_id = event.get("question_id")
+    if question_id is None:
+        return False
+    if event["type"] == "question_posted" and "created_at" not in event:
+        return False
+    if event["type"] == "question_voted" and "vote_type" not in event:
+        return False
+
+    ranking = _loaded_ranking(event["room_id"])
+    if ranking is None:
+        return True
+    if event["type"] == "question_posted":
+        ranking.add(question_id, datetime.fromisoformat(event["created_at"]))
+    elif event["type"] == "question_voted":
+        if event["vote_type"] == "up":
+            ranking.vote(question_id, event.get("vote_id"))
+    else:
+        ranking.mark_solved(question_id)
+    return True
+
+
+def handle_room_event(event: dict):
+    """Keep a room's ranking in step with changes made by other workers.
+
+    Posts, votes and solves are applied in place. Closed rooms are dropped
+    on every worker, as they are rarely read again, and moved rooms are
+    dropped so they are rebuilt from their new shard.
+    """
+    if event["type"] == "room_closed":
+        drop_room(event["room_id"])
+        return
+    if event.get("origin") == WORKER_ID:
+        return
+    if event["type"] in ("question_posted", "question_voted", "question_solved"):
+        if not _apply_remote(event):
+            drop_room(event["room_id"])
+    elif event["type"] == "room_moved":
+        drop_room(event["room_id"])
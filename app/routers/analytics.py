@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Optional
+
+from app import models, schemas
+from app.deps import get_room_read_db, get_current_teacher
+
+router = APIRouter(prefix="/rooms", tags=["Analytics"])
+
+MAX_TOP_PARTICIPANTS = 100
+
+
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Buckets are stored as naive UTC, so convert timestamps with an offset."""
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@router.get("/{room_id}/analytics", response_model=schemas.RoomAnalyticsResponse)
+def room_analytics(
+    room_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    top: int = Query(5, ge=1, le=MAX_TOP_PARTICIPANTS),
+    db: Session = Depends(get_room_read_db),
+    teacher: Row = Depends(get_current_teacher),
+):
+    """Per-minute activity, solve times and top participants of a room.
+
+    Reads only the rollup buckets, never raw questions or votes. `start` is
+    inclusive and `end` exclusive; both default to the whole room history.
+    Timestamps without an offset are taken as UTC.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    room = (
+        db.query(models.Room)
+        .filter(models.Room.id == room_id, models.Room.owner_id == teacher.id)
+        .first()
+    )
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    buckets_query = db.query(models.RoomActivityBucket).filter(
+        models.RoomActivityBucket.room_id == room_id
+    )
+    participants_query = db.query(
+        models.RoomParticipantBucket.student_name,
+        func.sum(models.RoomParticipantBucket.questions).label("questions"),
+        func.sum(models.RoomParticipantBucket.upvotes).label("upvotes"),
+    ).filter(models.RoomParticipantBucket.room_id == room_id)
+
+    if start is not None:
+        buckets_query = buckets_query.filter(
+            models.RoomActivityBucket.bucket_start >= start
+        )
+        participants_query = participants_query.filter(
+            models.RoomParticipantBucket.bucket_start >= start
+        )
+    if end is not None:
+        buckets_query = buckets_query.filter(
+            models.RoomActivityBucket.bucket_start < end
+        )
+        participants_query = participants_query.filter(
+            models.RoomParticipantBucket.bucket_start < end
+        )
+
+    buckets = buckets_query.order_by(models.RoomActivityBucket.bucket_start).all()
+    top_participants = (
+        participants_query.group_by(models.RoomParticipantBucket.student_name)
+        .order_by(
+            func.sum(models.RoomParticipantBucket.questions).desc(),
+            func.sum(models.RoomParticipantBucket.upvotes).desc(),
+        )
+        .limit(top)
+        .all()
+    )
+
+    questions = sum(b.questions for b in buckets)
+    votes = sum(b.votes for b in buckets)
+    solved = sum(b.solved for b in buckets)
+    solve_seconds = sum(b.solve_seconds for b in buckets)
+
+    # Rates are spread over the requested range, or the active span if open-ended
+    minutes = 0.0
+    if buckets:
+        range_start = start or buckets[0].bucket_start
+        range_end = end or buckets[-1].bucket_start
+        minutes = (range_end - range_start).total_seconds() / 60
+        if end is None:
+            minutes += 1
+    minutes = max(minutes, 1.0)
+
+    return {
+        "success": True,
+        "room_id": room_id,
+        "start": start,
+        "end": end,
+        "totals": {
+            "questions": questions,
+            "votes": votes,
+            "solved": solved,
+            "questions_per_minute": round(questions / minutes, 3),
+            "votes_per_minute": round(votes / minutes, 3),
+            "avg_seconds_to_solve": (
+                round(solve_seconds / solved, 1) if solved else None
+            ),
+        },
+        "buckets": buckets,
+        "top_participants": [
+            {"student_name": name, "questions": q, "upvotes": u}
+            for name, q, u in top_participants
+        ],
+    }
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header, Response
 from sqlalchemy.orm import Session
-from app import models, schemas, security
-from app.deps import get_db
+from app import models, schemas, security, sharding
+from app.deps import get_db, get_read_db, get_room_read_db
 from datetime import timedelta
 from typing import Optional
 import io
@@ -93,7 +93,7 @@ def admin_login(login_data: schemas.TeacherLogin):
 
 @router.get("/teachers/requests")
 def get_teacher_requests(
-    db: Session = Depends(get_db), x_admin_secret: Optional[str] = Header(None)
+    db: Session = Depends(get_read_db), x_admin_secret: Optional[str] = Header(None)
 ):
     """Get list of pending and approved teacher requests (Admin only)."""
     if x_admin_secret != ADMIN_SECRET:
@@ -164,7 +164,7 @@ def approve_teacher(
 @router.get("/admin/teachers/{teacher_id}/rooms")
 def get_teacher_rooms(
     teacher_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     x_admin_secret: Optional[str] = Header(None),
 ):
     """Get all rooms for a specific teacher (Admin only)."""
@@ -173,6 +173,16 @@ def get_teacher_rooms(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin secret"
         )
 
+    if sharding.enabled():
+        per_shard = sharding.fan_out(lambda shard: _teacher_rooms(shard, teacher_id))
+        results = [item for items in per_shard for item in items]
+    else:
+        results = _teacher_rooms(db, teacher_id)
+
+    return {"success": True, "rooms": results}
+
+
+def _teacher_rooms(db: Session, teacher_id: int) -> list:
     rooms = db.query(models.Room).filter(models.Room.owner_id == teacher_id).all()
 
     results = []
@@ -191,13 +201,13 @@ def get_teacher_rooms(
             }
         )
 
-    return {"success": True, "rooms": results}
+    return results
 
 
 @router.get("/admin/rooms/{room_id}/questions/download")
 def download_room_questions(
     room_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_room_read_db),
     x_admin_secret: Optional[str] = Header(None),
 ):
     """Download questions for a room as a PDF (Admin only)."""
@@ -0,0 +1,190 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, List, Optional
+import logging
+
+from app import models, participants, schemas, sharding
+from app.deps import get_write_db
+from app.routers.questions import create_question, get_question_list, question_posted
+from app.routers.rooms import find_open_room
+from app.routers.votes import create_vote, vote_cast
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Batch"])
+
+MAX_BATCH_OPERATIONS = 50
+
+
+def _require(value, name: str):
+    if value is None:
+        raise HTTPException(status_code=400, detail=f"{name} required")
+    return value
+
+
+class _BatchSessions:
+    """Hands out the session for each operation's room.
+
+    Without sharding every operation uses the request session. With sharding
+    each shard touched by the batch gets one session, committed together.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.shards: Dict[int, Session] = {}
+        self.after_commit: List[Callable[[], None]] = []
+
+    def _for_shard(self, shard: Optional[int], detail: str) -> Session:
+        if shard is None:
+            raise HTTPException(status_code=404, detail=detail)
+        if shard not in self.shards:
+            self.shards[shard] = sharding.session_for_shard(shard)
+        return self.shards[shard]
+
+    def for_room(self, room_id: int) -> Session:
+        if not sharding.enabled():
+            return self.db
+        return self._for_shard(sharding.shard_for_room(room_id), "Room not found")
+
+    def for_code(self, room_code: str) -> Session:
+        if not sharding.enabled():
+            return self.db
+        route = sharding.route_for_code(room_code)
+        return self._for_shard(route and route[1], "Room not found or closed")
+
+    def for_question(self, question_id: int) -> Session:
+        if not sharding.enabled():
+            return self.db
+        return self._for_shard(
+            sharding.shard_for_question(question_id), "Question not found"
+        )
+
+    def commit(self):
+        for db in [self.db, *self.shards.values()]:
+            db.commit()
+        for callback in self.after_commit:
+            callback()
+        self.after_commit.clear()
+
+    def close(self):
+        for db in self.shards.values():
+            db.close()
+
+
+@router.post("/batch", response_model=schemas.BatchResponse)
+def run_batch(data: schemas.BatchRequest, db: Session = Depends(get_write_db)):
+    """Run an ordered list of student operations in one request.
+
+    Every operation runs in its own savepoint so a failing one, including
+    one hitting a database error, is rolled back alone. Writes are committed together, either at the end or just before a
+    list operation so that it sees them.
+    Operations without a room_id use the room from the latest successful join.
+    """
+    if len(data.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch",
+        )
+
+    sessions = _BatchSessions(db)
+    try:
+        results = _run_operations(data.operations, sessions)
+        if sessions.after_commit:
+            sessions.commit()
+    finally:
+        sessions.close()
+
+    return {"success": True, "results": results}
+
+
+def _run_operations(
+    operations: List[schemas.BatchOperation], sessions: _BatchSessions
+) -> List[schemas.BatchResult]:
+    results: List[schemas.BatchResult] = []
+    current_room_id: Optional[int] = None
+
+    for op in operations:
+        if op.op == "list_questions" and sessions.after_commit:
+            sessions.commit()
+
+        try:
+            if op.op == "join":
+                code = _require(op.room_code, "room_code")
+                db = sessions.for_code(code)
+                with db.begin_nested():
+                    room = find_open_room(db, code)
+                current_room_id = room.id
+                participants.record(room.id, op.voter_token or op.student_name)
+                result = schemas.RoomOut.model_validate(room)
+
+            elif op.op == "post_question":
+                room_id = _require(op.room_id or current_room_id, "room_id")
+                db = sessions.for_room(room_id)
+                with db.begin_nested():
+                    q = create_question(
+                        db,
+                        room_id,
+                        schemas.QuestionCreate(
+                            title=_require(op.title, "title"),
+                            description=op.description,
+                            student_name=op.student_name,
+                        ),
+                    )
+                sessions.after_commit.append(lambda q=q: question_posted(q))
+                result = schemas.QuestionOut.model_validate(q)
+
+            elif op.op == "vote":
+                question_id = _require(op.question_id, "question_id")
+                db = sessions.for_question(question_id)
+                with db.begin_nested():
+                    v = create_vote(
+                        db,
+                        question_id,
+                        schemas.VoteCreate(
+                            vote_type=_require(op.vote_type, "vote_type"),
+                            voter_token=op.voter_token,
+                        ),
+                    )
+                q = db.get(models.Question, question_id)
+                sessions.after_commit.append(lambda q=q, v=v: vote_cast(q, v))
+                result = {"vote_id": v.id}
+
+            elif op.op == "list_questions":
+                room_id = _require(op.room_id or current_room_id, "room_id")
+                db = sessions.for_room(room_id)
+                with db.begin_nested():
+                    result = get_question_list(
+                        db, room_id, op.sort, op.solved, op.limit, op.since
+                    )
+
+            else:
+                raise HTTPException(
+                    status_code=400, detail=f"Unknown operation '{op.op}'"
+                )
+        except HTTPException as exc:
+            results.append(
+                schemas.BatchResult(
+                    op=op.op,
+                    success=False,
+                    status_code=exc.status_code,
+                    detail=exc.detail,
+                )
+            )
+            continue
+        except (SQLAlchemyError, ValueError):
+            # The savepoint is already rolled back; earlier writes are kept
+            logger.exception("Batch operation %s failed", op.op)
+            results.append(
+                schemas.BatchResult(
+                    op=op.op,
+                    success=False,
+                    status_code=500,
+                    detail="Operation failed",
+                )
+            )
+            continue
+
+        results.append(schemas.BatchResult(op=op.op, success=True, data=result))
+
+    return results
@@ -1,17 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import update
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List, Optional
-from app import models, schemas
-from app.deps import get_db, get_current_teacher
+from app import (
+    models,
+    schemas,
+    ranking,
+    events,
+    analytics,
+    participants,
+    sharding,
+    statements,
+)
+from app.deps import (
+    get_room_db,
+    get_room_read_db,
+    get_question_db,
+    get_current_teacher,
+)
 
 router = APIRouter(tags=["Questions"])
 
 
-@router.post("/rooms/{room_id}/questions", response_model=schemas.QuestionOut)
-def post_question(
-    room_id: int, data: schemas.QuestionCreate, db: Session = Depends(get_db)
-):
-    """Post a new question to a room."""
+def next_change_seq(db: Session, room_id: int) -> int:
+    """Bump and return the room's change sequence.
+
+    The row update also serializes concurrent writers to the same room, so
+    sequence numbers are handed out in commit order.
+    """
+    return db.execute(
+        update(models.Room)
+        .where(models.Room.id == room_id)
+        .values(change_seq=models.Room.change_seq + 1)
+        .returning(models.Room.change_seq)
+    ).scalar_one()
+
+
+def touch_question(db: Session, q: models.Question):
+    """Record that a question changed so delta syncs pick it up."""
+    q.updated_seq = next_change_seq(db, q.room_id)
+    q.updated_at = datetime.utcnow()
+
+
+def get_room_or_404(db: Session, room_id: int) -> Row:
+    room = db.execute(statements.ROOM_BY_ID, {"room_id": room_id}).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return room
+
+
+def create_question(
+    db: Session, room_id: int, data: schemas.QuestionCreate
+) -> models.Question:
+    """Add a question to an open room and flush it, without committing."""
     room = (
         db.query(models.Room)
         .filter(models.Room.id == room_id, models.Room.is_open == True)
@@ -26,56 +69,145 @@ def post_question(
         title=data.title,
         description=data.description,
         student_name=data.student_name,
+        updated_seq=next_change_seq(db, room_id),
     )
+    if sharding.enabled():
+        q.id = sharding.allocate_question_id(room_id)
     db.add(q)
+    db.flush()
+    analytics.record_question(db, q)
+    return q
+
+
+def question_posted(q: models.Question):
+    """Update in-memory state and notify workers once a new question is committed."""
+    ranking.record_question(q)
+    participants.record(q.room_id, q.student_name)
+    events.publish_room_event(
+        "question_posted",
+        q.room_id,
+        question_id=q.id,
+        created_at=q.created_at.isoformat(),
+    )
+
+
+@router.post("/rooms/{room_id}/questions", response_model=schemas.QuestionOut)
+def post_question(
+    room_id: int, data: schemas.QuestionCreate, db: Session = Depends(get_room_db)
+):
+    """Post a new question to a room."""
+    q = create_question(db, room_id, data)
     db.commit()
     db.refresh(q)
+    question_posted(q)
     return q
 
 
 @router.get("/rooms/{room_id}/questions", response_model=schemas.QuestionListResponse)
 def list_room_questions(
-    room_id: int, db: Session = Depends(get_db), sort: str = "recent"
+    room_id: int,
+    db: Session = Depends(get_room_read_db),
+    sort: str = "recent",
+    solved: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    since: Optional[int] = None,
 ):
-    """List all questions in a room with vote counts."""
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    """List all questions in a room with vote counts.
+
+    With `since` set to the cursor of an earlier response, only questions
+    created or changed after it are returned. Either way the response carries
+    the cursor to pass next time.
+    """
+    body = get_question_list(db, room_id, sort, solved, limit, since)
+    return {"success": True, **body}
+
+
+def get_question_list(
+    db: Session,
+    room_id: int,
+    sort: str = "recent",
+    solved: Optional[bool] = None,
+    limit: Optional[int] = None,
+    since: Optional[int] = None,
+) -> dict:
+    """Build the body of a question list response, full or delta."""
+    room = get_room_or_404(db, room_id)
+    # Read the cursor before the questions so no change can slip between them
+    cursor = room.change_seq
+
+    if since is not None:
+        questions = get_question_changes(db, room_id, since)
+    else:
+        questions = get_room_questions(db, room_id, sort, solved, limit)
+
+    # Questions are never deleted, so nothing is ever reported as removed
+    return {"questions": questions, "cursor": cursor, "removed_ids": []}
 
-    questions_query = (
-        db.query(models.Question).filter(models.Question.room_id == room_id).all()
+
+def get_question_changes(
+    db: Session, room_id: int, since: int
+) -> List[schemas.QuestionOut]:
+    """Load the questions of a room created or changed after `since`."""
+    rows = db.execute(
+        statements.QUESTION_CHANGES, {"room_id": room_id, "since": since}
+    )
+    return [schemas.QuestionOut.model_validate(row) for row in rows]
+
+
+def get_room_questions(
+    db: Session,
+    room_id: int,
+    sort: str = "recent",
+    solved: Optional[bool] = None,
+    limit: Optional[int] = None,
+) -> List[schemas.QuestionOut]:
+    """Load the questions of a room with vote counts, sorted and filtered."""
+    if sort == "hot":
+        return _hot_questions(db, room_id, solved, limit)
+
+    params = {"room_id": room_id}
+    if solved is not None:
+        params["solved"] = solved
+    if limit is not None:
+        params["limit"] = limit
+
+    stmt = statements.room_questions(
+        "votes" if sort == "votes" else "recent",
+        solved is not None,
+        limit is not None,
     )
+    return [schemas.QuestionOut.model_validate(row) for row in db.execute(stmt, params)]
 
-    results = []
-    for q in questions_query:
-        # Count upvotes
-        vote_count = (
-            db.query(models.QuestionVote)
-            .filter(
-                models.QuestionVote.question_id == q.id,
-                models.QuestionVote.vote_type == "up",
-            )
-            .count()
-        )
 
-        q_out = schemas.QuestionOut.model_validate(q)
-        q_out.votes = vote_count
-        results.append(q_out)
+def _hot_questions(
+    db: Session, room_id: int, solved: Optional[bool], limit: Optional[int]
+) -> List[schemas.QuestionOut]:
+    """Read the top questions of a room from its in-memory hot ranking."""
+    ranked = ranking.get_room_ranking(room_id).top(limit, solved)
+    if not ranked:
+        return []
 
-    # Sorting
-    if sort == "votes":
-        results.sort(key=lambda x: x.votes, reverse=True)
-    else:
-        results.sort(key=lambda x: x.created_at, reverse=True)
+    rows = db.execute(
+        statements.QUESTIONS_BY_IDS, {"ids": [qid for qid, _ in ranked]}
+    )
+    by_id = {row.id: row for row in rows}
 
-    return {"success": True, "questions": results}
+    results = []
+    for qid, votes in ranked:
+        q = by_id.get(qid)
+        if q is None:
+            continue
+        q_out = schemas.QuestionOut.model_validate(q)
+        q_out.votes = votes
+        results.append(q_out)
+    return results
 
 
 @router.post("/questions/{question_id}/solve", response_model=schemas.QuestionOut)
 def mark_solved(
     question_id: int,
-    db: Session = Depends(get_db),
-    teacher: models.Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_question_db),
+    teacher: Row = Depends(get_current_teacher),
 ):
     """Mark a question as solved (Only for the room owner)."""
     q = (
@@ -90,7 +222,13 @@ def mark_solved(
             status_code=403, detail="Not authorized to mark this question as solved"
         )
 
-    q.is_solved = True
+    if not q.is_solved:
+        q.is_solved = True
+        q.solved_at = datetime.utcnow()
+        touch_question(db, q)
+        analytics.record_solved(db, q)
     db.commit()
     db.refresh(q)
+    ranking.record_solved(q)
+    events.publish_room_event("question_solved", q.room_id, question_id=q.id)
     return q
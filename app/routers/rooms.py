@@ -1,12 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 import uuid
 import random
 import string
 from typing import List
 
-from app import models, schemas
-from app.deps import get_db, get_current_teacher
+from app import models, schemas, events, participants, sharding, statements
+from app.deps import (
+    get_read_db,
+    get_write_db,
+    get_room_db,
+    get_room_read_db,
+    get_current_teacher,
+)
 
 router = APIRouter(prefix="/rooms", tags=["Rooms"])
 
@@ -21,10 +28,13 @@ def gen_room_code():
 @router.post("", response_model=schemas.RoomResponse)
 def create_room(
     data: schemas.RoomCreate,
-    db: Session = Depends(get_db),
-    teacher: models.Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_write_db),
+    teacher: Row = Depends(get_current_teacher),
 ):
     """Create a new room for a teacher."""
+    if sharding.enabled():
+        return {"success": True, "room": _create_sharded_room(data, teacher)}
+
     code = gen_room_code()
     # Ensure unique room code
     while db.query(models.Room).filter(models.Room.room_code == code).first():
@@ -41,52 +51,72 @@ def create_room(
     return {"success": True, "room": room}
 
 
+def _create_sharded_room(
+    data: schemas.RoomCreate, teacher: Row
+) -> models.Room:
+    """Reserve an id and code on the primary, then create the room on its shard."""
+    room_id, code, shard = sharding.allocate_room(gen_room_code)
+    try:
+        with sharding.session_for_shard(shard) as db:
+            room = models.Room(
+                id=room_id,
+                title=data.title,
+                room_code=code,
+                owner_id=teacher.id,
+            )
+            db.add(room)
+            db.commit()
+            db.refresh(room)
+            db.expunge(room)
+    except Exception:
+        sharding.release_room(room_id)
+        raise
+    return room
+
+
 @router.get("/my-rooms", response_model=schemas.RoomListResponse)
 def list_my_rooms(
-    db: Session = Depends(get_db),
-    teacher: models.Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_read_db),
+    teacher: Row = Depends(get_current_teacher),
 ):
     """List all rooms created by the current teacher with counts."""
-    rooms = db.query(models.Room).filter(models.Room.owner_id == teacher.id).all()
-
-    results = []
-    for room in rooms:
-        # Count total questions
-        question_count = (
-            db.query(models.Question).filter(models.Question.room_id == room.id).count()
-        )
-
-        # Count unique students (participants)
-        participant_count = (
-            db.query(models.Question.student_name)
-            .filter(models.Question.room_id == room.id)
-            .distinct()
-            .count()
-        )
-
-        results.append(
-            {
-                "id": room.id,
-                "title": room.title,
-                "room_code": room.room_code,
-                "is_open": room.is_open,
-                "created_at": room.created_at,
-                "question_count": question_count,
-                "participant_count": participant_count,
-            }
-        )
+    if sharding.enabled():
+        # Each shard holds some of the teacher's rooms; query them all at once
+        per_shard = sharding.fan_out(lambda shard: room_list_items(shard, teacher.id))
+        results = [item for items in per_shard for item in items]
+    else:
+        results = room_list_items(db, teacher.id)
 
     # Sort rooms by created_at descending
     results.sort(key=lambda x: x["created_at"], reverse=True)
 
-    return {"success": True, "rooms": results}
+    # Students who took part in several rooms are counted once
+    total_participants = participants.count_many(room["id"] for room in results)
+
+    return {
+        "success": True,
+        "rooms": results,
+        "total_participants": total_participants,
+    }
+
+
+def room_list_items(db: Session, teacher_id: int) -> List[dict]:
+    """Summarize the rooms of a teacher stored in one database."""
+    rows = db.execute(statements.ROOMS_BY_OWNER, {"owner_id": teacher_id})
+    items = []
+    for row in rows:
+        item = dict(row._mapping)
+        sketch = item.pop("participant_sketch")
+        item["participant_count"] = participants.count_stored(row.id, sketch)
+        items.append(item)
+    return items
 
 
 @router.get("/{room_id}", response_model=schemas.RoomOut)
 def get_room(
     room_id: int,
-    db: Session = Depends(get_db),
-    teacher: models.Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_room_read_db),
+    teacher: Row = Depends(get_current_teacher),
 ):
     """Get details of a specific room."""
     room = (
@@ -103,13 +133,8 @@ def get_room(
         db.query(models.Question).filter(models.Question.room_id == room.id).count()
     )
 
-    # Count unique students (participants)
-    participant_count = (
-        db.query(models.Question.student_name)
-        .filter(models.Question.room_id == room.id)
-        .distinct()
-        .count()
-    )
+    # Estimated unique students (participants)
+    participant_count = participants.count(db, room.id)
 
     return {
         "id": room.id,
@@ -123,30 +148,43 @@ def get_room(
     }
 
 
+def find_open_room(db: Session, code: str) -> Row:
+    """Look up an open room by its code."""
+    room = db.execute(statements.OPEN_ROOM_BY_CODE, {"room_code": code}).first()
+
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found or closed")
+
+    return room
+
+
 @router.post("/join", response_model=schemas.RoomResponse)
-def join_by_code(payload: dict, db: Session = Depends(get_db)):
+def join_by_code(payload: dict, db: Session = Depends(get_read_db)):
     """Join a room using a room code."""
     code = payload.get("room_code")
     if not code:
         raise HTTPException(status_code=400, detail="room_code required")
 
-    room = (
-        db.query(models.Room)
-        .filter(models.Room.room_code == code, models.Room.is_open == True)
-        .first()
+    if sharding.enabled():
+        route = sharding.route_for_code(code)
+        if route is None:
+            raise HTTPException(status_code=404, detail="Room not found or closed")
+        with sharding.session_for_shard(route[1]) as shard_db:
+            room = find_open_room(shard_db, code)
+    else:
+        room = find_open_room(db, code)
+
+    participants.record(
+        room.id, payload.get("voter_token") or payload.get("student_name")
     )
-
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found or closed")
-
     return {"success": True, "room": room}
 
 
 @router.post("/{room_id}/close")
 def close_room(
     room_id: int,
-    db: Session = Depends(get_db),
-    teacher: models.Teacher = Depends(get_current_teacher),
+    db: Session = Depends(get_room_db),
+    teacher: Row = Depends(get_current_teacher),
 ):
     """Close a room so no more questions can be posted."""
     room = (
@@ -160,4 +198,5 @@ def close_room(
 
     room.is_open = False
     db.commit()
+    events.publish_room_event("room_closed", room_id)
     return {"success": True, "message": "Room closed successfully"}
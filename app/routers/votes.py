@@ -1,16 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from app import models, schemas
-from app.deps import get_db
+from app import models, schemas, ranking, events, analytics, participants
+from app.deps import get_question_db
+from app.routers.questions import touch_question
 
 router = APIRouter(tags=["Votes"])
 
 
-@router.post("/questions/{question_id}/vote")
-def vote_question(
-    question_id: int, data: schemas.VoteCreate, db: Session = Depends(get_db)
-):
-    """Cast a vote on a question."""
+def create_vote(
+    db: Session, question_id: int, data: schemas.VoteCreate
+) -> models.QuestionVote:
+    """Add a vote on a question and flush it, without committing."""
     q = db.query(models.Question).filter(models.Question.id == question_id).first()
     if not q:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -22,6 +22,34 @@ def vote_question(
         question_id=question_id, voter_token=data.voter_token, vote_type=data.vote_type
     )
     db.add(v)
+    touch_question(db, q)
+    db.flush()
+    analytics.record_vote(db, q, v)
+    return v
+
+
+def vote_cast(q: models.Question, v: models.QuestionVote):
+    """Update in-memory state and notify workers once a vote is committed."""
+    ranking.record_vote(q, v)
+    participants.record(q.room_id, v.voter_token)
+    events.publish_room_event(
+        "question_voted",
+        q.room_id,
+        question_id=q.id,
+        vote_id=v.id,
+        vote_type=v.vote_type,
+    )
+
+
+@router.post("/questions/{question_id}/vote")
+def vote_question(
+    question_id: int,
+    data: schemas.VoteCreate,
+    db: Session = Depends(get_question_db),
+):
+    """Cast a vote on a question."""
+    v = create_vote(db, question_id, data)
     db.commit()
     db.refresh(v)
+    vote_cast(db.get(models.Question, question_id), v)
     return {"success": True, "vote_id": v.id}
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Optional, List
 from datetime import datetime
 
 # --- Authentication & Teacher Request Schemas ---
@@ -68,6 +68,7 @@ class RoomListItem(BaseModel):
 class RoomListResponse(BaseModel):
     success: bool
     rooms: List[RoomListItem]
+    total_participants: int = 0
 
 
 # --- Question Schemas ---
@@ -96,6 +97,8 @@ class QuestionOut(BaseModel):
 class QuestionListResponse(BaseModel):
     success: bool
     questions: List[QuestionOut]
+    cursor: int = 0
+    removed_ids: List[int] = []
 
 
 # --- Vote Schemas ---
@@ -104,3 +107,77 @@ class QuestionListResponse(BaseModel):
 class VoteCreate(BaseModel):
     vote_type: str
     voter_token: Optional[str] = None
+
+
+# --- Analytics Schemas ---
+
+
+class ActivityBucketOut(BaseModel):
+    bucket_start: datetime
+    questions: int
+    votes: int
+    solved: int
+
+    class Config:
+        from_attributes = True
+
+
+class ParticipantStatOut(BaseModel):
+    student_name: str
+    questions: int
+    upvotes: int
+
+
+class RoomAnalyticsTotals(BaseModel):
+    questions: int
+    votes: int
+    solved: int
+    questions_per_minute: float
+    votes_per_minute: float
+    avg_seconds_to_solve: Optional[float] = None
+
+
+class RoomAnalyticsResponse(BaseModel):
+    success: bool
+    room_id: int
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    totals: RoomAnalyticsTotals
+    buckets: List[ActivityBucketOut]
+    top_participants: List[ParticipantStatOut]
+
+
+# --- Batch Schemas ---
+
+
+class BatchOperation(BaseModel):
+    op: str
+    room_code: Optional[str] = None
+    room_id: Optional[int] = None
+    question_id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    student_name: Optional[str] = None
+    vote_type: Optional[str] = None
+    voter_token: Optional[str] = None
+    sort: str = "recent"
+    solved: Optional[bool] = None
+    limit: Optional[int] = Field(None, ge=1)
+    since: Optional[int] = None
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+
+class BatchResult(BaseModel):
+    op: str
+    success: bool
+    status_code: int = 200
+    detail: Optional[str] = None
+    data: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    success: bool
+    results: List[BatchResult]
@@ -0,0 +1,434 @@
+import argparse
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app import database, models
+from app.database import SessionLocal
+
+# Optional room shards, as a comma-separated list of database URLs.
+# When set, rooms, questions, votes and rollups live on the shards, and the
+# primary database keeps teachers plus the routing tables.
+SHARD_URLS = [
+    url.strip() for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()
+]
+
+# Tables on the primary that map rooms and questions to shards
+ROUTING_TABLES = [models.RoomShard.__table__, models.QuestionShard.__table__]
+
+# Tables whose rows are placed on a shard by room id
+SHARDED_TABLES = [
+    models.Room.__table__,
+    models.Question.__table__,
+    models.QuestionVote.__table__,
+    models.RoomActivityBucket.__table__,
+    models.RoomParticipantBucket.__table__,
+]
+
+# How long a worker trusts its cached room routes. A room move waits longer
+# than this before its final copy, so every worker sees the new route first.
+ROUTE_CACHE_SECONDS = float(os.getenv("SHARD_ROUTE_CACHE_SECONDS", 5))
+# Added to a moved room's change_seq, so sequence numbers handed out on the
+# new shard stay above those still handed out on the old one during a move
+MOVE_SEQ_GAP = 1_000_000
+
+shard_engines = [create_engine(url, pool_pre_ping=True) for url in SHARD_URLS]
+_executor = ThreadPoolExecutor(max_workers=len(shard_engines) or 1)
+
+T = TypeVar("T")
+
+# room_id -> (shard, monotonic time cached); expires after ROUTE_CACHE_SECONDS
+_room_shards: Dict[int, Tuple[int, float]] = {}
+# question_id -> room_id; questions never change rooms
+_question_rooms: Dict[int, int] = {}
+_QUESTION_CACHE_SIZE = 100_000
+_cache_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(shard_engines)
+
+
+def session_for_shard(shard: int) -> Session:
+    return SessionLocal(bind=shard_engines[shard])
+
+
+def placement_for_code(room_code: str) -> int:
+    """Pick the shard for a new room by hashing its code."""
+    return zlib.crc32(room_code.encode()) % len(shard_engines)
+
+
+def shard_for_room(room_id: int) -> Optional[int]:
+    """Return the shard holding a room, or None if the room does not exist."""
+    cached = _room_shards.get(room_id)
+    if cached is not None and time.monotonic() - cached[1] < ROUTE_CACHE_SECONDS:
+        return cached[0]
+
+    with SessionLocal() as db:
+        route = db.get(models.RoomShard, room_id)
+    with _cache_lock:
+        if route is None:
+            _room_shards.pop(room_id, None)
+            return None
+        _room_shards[room_id] = (route.shard, time.monotonic())
+    return route.shard
+
+
+def session_for_room(room_id: int) -> Optional[Session]:
+    """Return a primary session for a room's data, or None if it does not exist.
+
+    This is the room's shard when rooms are sharded, the primary otherwise.
+    """
+    if not enabled():
+        return SessionLocal()
+    shard = shard_for_room(room_id)
+    return None if shard is None else session_for_shard(shard)
+
+
+def route_for_code(room_code: str) -> Optional[Tuple[int, int]]:
+    """Return (room_id, shard) for a room code, or None if it is unknown."""
+    with SessionLocal() as db:
+        route = (
+            db.query(models.RoomShard)
+            .filter(models.RoomShard.room_code == room_code)
+            .first()
+        )
+    if route is None:
+        return None
+    return route.room_id, route.shard
+
+
+def room_for_question(question_id: int) -> Optional[int]:
+    """Return the room a question belongs to, or None if it does not exist."""
+    room_id = _question_rooms.get(question_id)
+    if room_id is not None:
+        return room_id
+
+    with SessionLocal() as db:
+        route = db.get(models.QuestionShard, question_id)
+    if route is None:
+        return None
+    with _cache_lock:
+        if len(_question_rooms) >= _QUESTION_CACHE_SIZE:
+            _question_rooms.clear()
+        _question_rooms[question_id] = route.room_id
+    return route.room_id
+
+
+def shard_for_question(question_id: int) -> Optional[int]:
+    room_id = room_for_question(question_id)
+    return None if room_id is None else shard_for_room(room_id)
+
+
+def allocate_room(gen_code: Callable[[], str]) -> Tuple[int, str, int]:
+    """Reserve a globally unique room id and code on the primary.
+
+    Returns (room_id, room_code, shard).
+    """
+    with SessionLocal() as db:
+        while True:
+            code = gen_code()
+            route = models.RoomShard(room_code=code, shard=placement_for_code(code))
+            db.add(route)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Room code already taken, try another one
+                db.rollback()
+                continue
+            return route.room_id, route.room_code, route.shard
+
+
+def release_room(room_id: int):
+    """Drop the route of a room whose shard row could not be created."""
+    with SessionLocal() as db:
+        db.query(models.RoomShard).filter(models.RoomShard.room_id == room_id).delete()
+        db.commit()
+
+
+def allocate_question_id(room_id: int) -> int:
+    """Reserve a globally unique question id on the primary."""
+    with SessionLocal() as db:
+        route = models.QuestionShard(room_id=room_id)
+        db.add(route)
+        db.commit()
+        question_id = route.question_id
+    with _cache_lock:
+        _question_rooms[question_id] = room_id
+    return question_id
+
+
+def fan_out(fn: Callable[[Session], T]) -> List[T]:
+    """Run fn against every shard in parallel and return the results in shard order."""
+
+    def run(shard: int) -> T:
+        with session_for_shard(shard) as db:
+            return fn(db)
+
+    return list(_executor.map(run, range(len(shard_engines))))
+
+
+def handle_room_event(event: dict):
+    """Forget a moved room's cached shard before its cache entry expires."""
+    if event["type"] == "room_moved":
+        with _cache_lock:
+            _room_shards.pop(event["room_id"], None)
+
+
+def create_routing_tables():
+    """Create the routing tables on the primary database."""
+    database.Base.metadata.create_all(database.engine, tables=ROUTING_TABLES)
+
+
+def create_shard_tables():
+    """Create the sharded tables on every shard.
+
+    Foreign keys to teachers are left out because teachers stay on the primary.
+    """
+    for engine in shard_engines:
+        with engine.begin() as conn:
+            for table in SHARDED_TABLES:
+                if engine.dialect.has_table(conn, table.name):
+                    continue
+                constraints = [
+                    fk
+                    for fk in table.foreign_key_constraints
+                    if fk.referred_table.name != models.Teacher.__tablename__
+                ]
+                conn.execute(
+                    CreateTable(table, include_foreign_key_constraints=constraints)
+                )
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index))
+
+
+class _MoveCursor:
+    """What the first copy of a room move read from the old shard."""
+
+    def __init__(self, change_seq: int, vote_id: int, buckets: Dict):
+        self.change_seq = change_seq
+        self.vote_id = vote_id
+        self.buckets = buckets
+
+
+def _copy_votes(
+    src: Session, dst: Session, question_ids: List[int], after_id: int
+) -> Tuple[int, Set[int]]:
+    """Copy votes with source ids above after_id to dst.
+
+    Vote ids are only unique per shard, so copies get new ids. Returns the
+    highest source id copied and the questions that got votes.
+    """
+    highest, voted = after_id, set()
+    if not question_ids:
+        return highest, voted
+    votes = (
+        src.query(models.QuestionVote)
+        .filter(
+            models.QuestionVote.question_id.in_(question_ids),
+            models.QuestionVote.id > after_id,
+        )
+        .order_by(models.QuestionVote.id)
+    )
+    for v in votes:
+        dst.add(
+            models.QuestionVote(
+                question_id=v.question_id,
+                voter_token=v.voter_token,
+                vote_type=v.vote_type,
+                created_at=v.created_at,
+            )
+        )
+        highest = v.id
+        voted.add(v.question_id)
+    return highest, voted
+
+
+def _copy_room(src: Session, dst: Session, room_id: int) -> _MoveCursor:
+    """First pass of a move: copy a room's rows to a shard that has none."""
+    from app import analytics
+
+    room = src.get(models.Room, room_id)
+    # Rollups first: anything counted after this is added by the second pass
+    buckets = analytics.bucket_counts(src, room_id)
+    change_seq = room.change_seq
+
+    dst.merge(room).change_seq = change_seq + MOVE_SEQ_GAP
+
+    question_ids = []
+    for q in src.query(models.Question).filter(models.Question.room_id == room_id):
+        dst.merge(q)
+        question_ids.append(q.id)
+    vote_id, _ = _copy_votes(src, dst, question_ids, 0)
+    analytics.add_bucket_counts(dst, buckets)
+    dst.commit()
+    return _MoveCursor(change_seq, vote_id, buckets)
+
+
+def _copy_changes(src: Session, dst: Session, room_id: int, cursor: _MoveCursor):
+    """Second pass of a move: apply what the old shard got after the first.
+
+    The room is live on dst by now, so rows are merged rather than replaced.
+    Solving is one-way, so a question is solved if either shard solved it.
+    Every question that changed is stamped with a new dst change_seq, and
+    rollups are incremented by what the old shard counted since the first
+    pass.
+    """
+    from app import analytics
+    from app.routers.questions import touch_question
+
+    src_room = src.get(models.Room, room_id)
+    dst_room = dst.get(models.Room, room_id)
+    dst_room.is_open = dst_room.is_open and src_room.is_open
+
+    copied = {
+        q.id: q
+        for q in dst.query(models.Question).filter(models.Question.room_id == room_id)
+    }
+    changed, question_ids = [], []
+    for q in src.query(models.Question).filter(models.Question.room_id == room_id):
+        question_ids.append(q.id)
+        target = copied.get(q.id)
+        if target is None:
+            changed.append(dst.merge(q))
+        elif q.updated_seq > cursor.change_seq:
+            if q.is_solved and not target.is_solved:
+                target.is_solved = True
+                target.solved_at = q.solved_at
+            changed.append(target)
+
+    _, voted = _copy_votes(src, dst, question_ids, cursor.vote_id)
+    dst.flush()
+    changed_ids = {q.id for q in changed}
+    changed.extend(copied[qid] for qid in voted - changed_ids if qid in copied)
+    for q in changed:
+        touch_question(dst, q)
+
+    analytics.add_bucket_counts(
+        dst, analytics.bucket_counts(src, room_id), minus=cursor.buckets
+    )
+    dst.commit()
+
+
+def _delete_room(db: Session, room_id: int):
+    question_ids = db.query(models.Question.id).filter(
+        models.Question.room_id == room_id
+    )
+    db.query(models.QuestionVote).filter(
+        models.QuestionVote.question_id.in_(question_ids.scalar_subquery())
+    ).delete(synchronize_session=False)
+    for model in (
+        models.RoomActivityBucket,
+        models.RoomParticipantBucket,
+        models.Question,
+    ):
+        db.query(model).filter(model.room_id == room_id).delete(
+            synchronize_session=False
+        )
+    db.query(models.Room).filter(models.Room.id == room_id).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def move_room(room_id: int, target: int, grace_seconds: Optional[float] = None):
+    """Move a room and all its rows to another shard.
+
+    Rows are copied and the route is flipped. Workers pick up the new route
+    when their cached one expires, or sooner through a room_moved event, so
+    the move waits longer than ROUTE_CACHE_SECONDS (by default) before a
+    second pass applies what the old shard got in the meantime. The old rows
+    are then deleted, and a second room_moved event drops rankings built
+    before the second pass. Workers the event does not reach rebuild theirs
+    within RANKING_MAX_AGE_SECONDS.
+    """
+    from app import events
+
+    if grace_seconds is None:
+        grace_seconds = ROUTE_CACHE_SECONDS + 1
+
+    with SessionLocal() as db:
+        route = db.get(models.RoomShard, room_id)
+        if route is None:
+            raise ValueError(f"Room {room_id} not found")
+        source = route.shard
+        if source == target:
+            return
+
+        src = session_for_shard(source)
+        dst = session_for_shard(target)
+        try:
+            if dst.get(models.Room, room_id) is not None:
+                raise ValueError(f"Room {room_id} already has rows on shard {target}")
+            cursor = _copy_room(src, dst, room_id)
+
+            route.shard = target
+            db.commit()
+            events.publish_room_event("room_moved", room_id, shard=target)
+
+            time.sleep(grace_seconds)
+            src.expire_all()
+            dst.expire_all()
+            _copy_changes(src, dst, room_id, cursor)
+            _delete_room(src, room_id)
+            # Rankings built from the new shard during the grace period
+            # lack what _copy_changes added
+            events.publish_room_event("room_moved", room_id, shard=target)
+        finally:
+            src.close()
+            dst.close()
+
+
+def shard_sizes() -> List[int]:
+    """Number of rooms routed to each shard."""
+    with SessionLocal() as db:
+        counts = dict(
+            db.query(models.RoomShard.shard, func.count(models.RoomShard.room_id))
+            .group_by(models.RoomShard.shard)
+            .all()
+        )
+    return [counts.get(shard, 0) for shard in range(len(shard_engines))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room sharding tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser(
+        "init", help="Create the routing tables and the sharded tables on every shard"
+    )
+    subcommands.add_parser("status", help="Show how many rooms each shard holds")
+    move_parser = subcommands.add_parser("move", help="Move a room to another shard")
+    move_parser.add_argument("room_id", type=int)
+    move_parser.add_argument("shard", type=int)
+    args = parser.parse_args()
+
+    if not enabled():
+        parser.error("SHARD_URLS is not set")
+
+    if args.command == "init":
+        create_routing_tables()
+        create_shard_tables()
+        print(
+            f"Created routing tables on the primary and sharded tables on "
+            f"{len(shard_engines)} shard(s)"
+        )
+    elif args.command == "status":
+        for shard, rooms in enumerate(shard_sizes()):
+            print(f"shard {shard}: {rooms} room(s)")
+    elif args.command == "move":
+        if not 0 <= args.shard < len(shard_engines):
+            parser.error(f"shard must be between 0 and {len(shard_engines) - 1}")
+        move_room(args.room_id, args.shard)
+        print(f"Moved room {args.room_id} to shard {args.shard}")
+
+
+if __name__ == "__main__":
+    main()
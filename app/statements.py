@@ -0,0 +1,149 @@
+import threading
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, event, func, select, true
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.sql import Select
+
+from app import models
+
+# Pre-built Core statements for the hot read paths. They return plain rows
+# rather than ORM objects, and being built once, every execution after the
+# first is served from SQLAlchemy's compiled statement cache.
+
+teachers = models.Teacher.__table__
+rooms = models.Room.__table__
+questions = models.Question.__table__
+votes = models.QuestionVote.__table__
+
+TEACHER_BY_EMAIL = select(teachers.c.id, teachers.c.name, teachers.c.email).where(
+    teachers.c.email == bindparam("email")
+)
+
+# Every room column except the participant sketch
+ROOM_COLUMNS = (
+    rooms.c.id,
+    rooms.c.title,
+    rooms.c.room_code,
+    rooms.c.owner_id,
+    rooms.c.is_open,
+    rooms.c.created_at,
+    rooms.c.change_seq,
+)
+
+ROOM_BY_ID = select(*ROOM_COLUMNS).where(rooms.c.id == bindparam("room_id"))
+
+OPEN_ROOM_BY_CODE = select(*ROOM_COLUMNS).where(
+    rooms.c.room_code == bindparam("room_code"), rooms.c.is_open == true()
+)
+
+ROOMS_BY_OWNER = select(
+    rooms.c.id,
+    rooms.c.title,
+    rooms.c.room_code,
+    rooms.c.is_open,
+    rooms.c.created_at,
+    rooms.c.participant_sketch,
+    select(func.count(questions.c.id))
+    .where(questions.c.room_id == rooms.c.id)
+    .scalar_subquery()
+    .label("question_count"),
+).where(rooms.c.owner_id == bindparam("owner_id"))
+
+QUESTION_COLUMNS = (
+    questions.c.id,
+    questions.c.room_id,
+    questions.c.title,
+    questions.c.description,
+    questions.c.student_name,
+    questions.c.created_at,
+    questions.c.is_solved,
+)
+
+_up_votes = (
+    select(votes.c.question_id, func.count(votes.c.id).label("votes"))
+    .join(questions, questions.c.id == votes.c.question_id)
+    .where(questions.c.room_id == bindparam("room_id"), votes.c.vote_type == "up")
+    .group_by(votes.c.question_id)
+    .subquery()
+)
+
+_questions_with_votes = (
+    select(*QUESTION_COLUMNS, func.coalesce(_up_votes.c.votes, 0).label("votes"))
+    .outerjoin(_up_votes, _up_votes.c.question_id == questions.c.id)
+    .where(questions.c.room_id == bindparam("room_id"))
+)
+
+QUESTIONS_BY_IDS = select(*QUESTION_COLUMNS).where(
+    questions.c.id.in_(bindparam("ids", expanding=True))
+)
+
+QUESTION_CHANGES = _questions_with_votes.where(
+    questions.c.updated_seq > bindparam("since")
+).order_by(questions.c.updated_seq)
+
+
+@lru_cache(maxsize=None)
+def room_questions(sort: str, by_solved: bool, limited: bool) -> Select:
+    """Return the statement listing a room's questions with up vote counts.
+
+    Params: room_id, plus solved when by_solved and limit when limited.
+    """
+    stmt = _questions_with_votes
+    if by_solved:
+        stmt = stmt.where(questions.c.is_solved == bindparam("solved"))
+    if sort == "votes":
+        stmt = stmt.order_by(func.coalesce(_up_votes.c.votes, 0).desc(), questions.c.id)
+    else:
+        stmt = stmt.order_by(questions.c.created_at.desc())
+    if limited:
+        stmt = stmt.limit(bindparam("limit"))
+    return stmt
+
+
+class StatementStats:
+    """Counts executions and compiled-cache hits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.hits = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            self.executions += 1
+            self.hits += hit
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        if not self.executions:
+            return None
+        return round(self.hits / self.executions, 4)
+
+    def snapshot(self) -> Dict:
+        return {
+            "executions": self.executions,
+            "hits": self.hits,
+            "hit_rate": self.hit_rate,
+        }
+
+
+# Totals for this worker, plus the stats of the request being handled
+totals = StatementStats()
+current_request: ContextVar[Optional[StatementStats]] = ContextVar(
+    "statement_stats", default=None
+)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    hit = context.cache_hit is CacheStats.CACHE_HIT
+    totals.record(hit)
+    stats = current_request.get()
+    if stats is not None:
+        stats.record(hit)